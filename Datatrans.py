@@ -1,20 +1,78 @@
+import time
+
+_STARTED_AT = time.perf_counter()
+
 import asyncio
+import json
+import math
 import websockets
 import datetime
 import signal
 import sys
 import socket
 import os
-import pandas as pd
-import numpy as np
-import glob
-import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from runtime_stats import report_startup
+from stream_hub import StreamHub
+
+# pandas, glob, shutil 등 분석/파일 정리용 모듈은 실제로 필요한 함수 안에서 불러옴
+# (수신 루프는 문자열 처리와 파일 쓰기만 하므로 서버 재시작이 빠르고 메모리가 작게 유지됨)
+
 # 전역 변수: 현재 워치와 DOT 세션 파일명과 세션 번호
 current_watch_file = None
 current_dot_file = None
 session_active = False
+current_session_number = None
+# 추가 DOT 센서(DOT1:, DOT2: ... 접두어) 파일: 장치 이름 → 파일 경로 (첫 데이터 수신 시 생성)
+extra_device_files = {}
+
+# 병합 작업용 프로세스 (첫 병합 때 생성, pandas는 이 프로세스에만 로드됨)
+merge_executor = None
+
+# 다중 워커 모드에서 워커들이 공유하는 세션 번호 카운터 (multiprocessing.Value)
+session_allocator = None
+
+# 장치별 CSV 열 구성
+WATCH_COLUMNS = ["Timestamp", "Acc_X", "Acc_Y", "Acc_Z", "Gyro_X", "Gyro_Y", "Gyro_Z"]
+DOT_COLUMNS = WATCH_COLUMNS + [
+    "Euler_Roll", "Euler_Pitch", "Euler_Yaw", "Quat_W", "Quat_X", "Quat_Y", "Quat_Z",
+]
+DEVICE_COLUMNS = {"WATCH": WATCH_COLUMNS, "DOT": DOT_COLUMNS}
+
+# 세션 종료 배리어 설정
+# SESSION_END:{"WATCH": "<마지막 타임스탬프>", "DOT": "..."} 또는 STREAM_END:<장치>:<마지막 타임스탬프>
+# 로 각 스트림의 마지막 샘플을 알려주면, 그 샘플까지 모두 받는 즉시 세션을 마무리함.
+# 마크는 해당 장치 행의 시각과 같은 형식(ISO 날짜/시각 문자열), 숫자(epoch 초) 또는 순번으로 보냄.
+SESSION_END_TIMEOUT = 10.0  # 마크까지 도달하지 못해도 이 시간이 지나면 마무리 (대비책)
+# 마크 없이 SESSION_END 만 온 경우 (현재 iOS 클라이언트): SESSION_END 수신 후, 그리고 마지막 데이터
+# 수신 후 이 시간 동안 새 데이터가 없으면 마무리. 재연결 후 보류 메시지가 다시 오는 공백을 견디도록
+# 기존 고정 대기(1.5초)보다 짧게 잡지 않음.
+SESSION_END_QUIET = 1.5
+
+# 진행 상황과 마크는 time_value() 로 해석한 값(epoch 초 또는 순번)으로 비교함
+stream_progress = {}  # 장치 → 이번 세션에서 받은 가장 늦은 시각/순번
+untimed_streams = set()  # 시각을 알아볼 수 없는 행이 들어온 장치 (마크와 비교 불가)
+drain_marks = {}  # 장치 → 세션 종료 시 보고된 마지막 시각/순번 (해석할 수 없으면 None)
+data_arrived = asyncio.Event()  # 데이터 수신 시 종료 대기 작업을 깨움
+last_row_time = 0.0
+finalize_task = None
+
+# 재연결 시 클라이언트가 보류 메시지를 다시 보내 생기는 중복 행 제거
+# 재전송은 같은 메시지를 그대로 다시 보내므로 행 내용 전체가 같을 때만 중복으로 봄
+# (초 단위 타임스탬프처럼 시각이 같은 서로 다른 샘플은 그대로 기록).
+# 장치별로 최근 DEDUP_WINDOW 개 행만 기억함 (deque 로 순서 유지, set 으로 O(1) 조회)
+# 시각을 알아볼 수 없는 행(ping 등)은 중복 검사 없이 그대로 기록
+DEDUP_WINDOW = 4096
+recent_samples = {}  # 장치 → (deque, set)
+duplicate_counts = {}  # 장치 → 이번 세션에서 버린 중복 행 수
+
+# 실시간 뷰어 구독 (SUBSCRIBE:{...} 메시지로 연결한 클라이언트에게 줄여서 전송)
+stream_hub = StreamHub()
+for device, columns in DEVICE_COLUMNS.items():
+    stream_hub.register_device(device, columns)
 
 def get_ip_address():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -29,6 +87,8 @@ def get_ip_address():
 
 # 세션 번호를 확인해서 삭제 되더라도 1부터 시작
 def get_next_session_number():
+    import glob
+
     base_dir = "/Users/yoosehyeok/Documents/RecordingData"
     if not os.path.exists(base_dir):
         os.makedirs(base_dir)
@@ -70,6 +130,18 @@ def get_next_session_number():
     print(f"다음 세션 번호로 {next_number} 사용")
     return next_number
 
+def allocate_session_number():
+    """다음 세션 번호를 반환합니다.
+
+    단일 프로세스에서는 매번 파일 시스템을 확인하고, 다중 워커 모드에서는
+    시작 시 파일 시스템으로 초기화한 공유 카운터를 잠금 하에 증가시킵니다.
+    """
+    if session_allocator is None:
+        return get_next_session_number()
+    with session_allocator.get_lock():
+        session_allocator.value += 1
+        return session_allocator.value
+
 # 기존 데이터 이동 함수
 def ensure_raw_directory():
     base_dir = "/Users/yoosehyeok/Documents/RecordingData"
@@ -87,6 +159,8 @@ def move_to_raw_directory(file_path):
         print(f"이동할 파일이 존재하지 않습니다: {file_path}")
         return False
     
+    import shutil
+
     raw_dir = ensure_raw_directory()
     filename = os.path.basename(file_path)
     new_path = os.path.join(raw_dir, filename)
@@ -101,11 +175,12 @@ def move_to_raw_directory(file_path):
 
 def new_session_files():
     # 매 세션 시작마다 파일 시스템을 확인하여 다음 세션 번호를 결정
-    global current_watch_file, current_dot_file, session_active
+    global current_watch_file, current_dot_file, session_active, current_session_number
     
     # 중요: 매 호출마다 새로운 세션 번호 계산 (파일 삭제 반영)
-    session_number = get_next_session_number()
+    session_number = allocate_session_number()
     print(f"새로운 세션 시작: 세션 번호 {session_number}")
+    current_session_number = session_number
     
     session_active = True  # 세션 활성화 플래그 설정
     base_dir = "/Users/yoosehyeok/Documents/RecordingData"
@@ -121,143 +196,435 @@ def new_session_files():
 
     # 워치 CSV 헤더만 작성
     with open(current_watch_file, "w") as file:
-        file.write("Timestamp,Acc_X,Acc_Y,Acc_Z,Gyro_X,Gyro_Y,Gyro_Z\n")
+        file.write(",".join(WATCH_COLUMNS) + "\n")
     # DOT CSV 헤더만 작성
     with open(current_dot_file, "w") as file:
-        file.write("Timestamp,Acc_X,Acc_Y,Acc_Z,Gyro_X,Gyro_Y,Gyro_Z,Euler_Roll,Euler_Pitch,Euler_Yaw,Quat_W,Quat_X,Quat_Y,Quat_Z\n")
+        file.write(",".join(DOT_COLUMNS) + "\n")
     print(f"새로운 세션 파일 생성됨:\n 워치: {current_watch_file}\n DOT: {current_dot_file}")
 
-# 새로 추가된 함수: 두 CSV 파일을 동기화하여 하나로 병합
-def merge_sensor_files(watch_file, dot_file):
+def extra_device_file(device):
+    """추가 DOT 센서(DOT1, DOT2 ...)의 세션 파일을 반환합니다. 처음이면 헤더와 함께 생성."""
+    path = extra_device_files.get(device)
+    if path is None:
+        if device not in DEVICE_COLUMNS:
+            DEVICE_COLUMNS[device] = DOT_COLUMNS
+            stream_hub.register_device(device, DOT_COLUMNS)
+        base_dir = "/Users/yoosehyeok/Documents/RecordingData"
+        path = os.path.join(base_dir, f"session{current_session_number}_{device.lower()}.csv")
+        with open(path, "w") as file:
+            file.write(",".join(DOT_COLUMNS) + "\n")
+        extra_device_files[device] = path
+        print(f"추가 DOT 세션 파일 생성됨: {path}")
+    return path
+
+def _nearest_indices(sorted_times, targets):
+    """정렬된 시각 배열에서 각 target 과 가장 가까운 위치를 찾습니다 (동일 거리면 이른 쪽)."""
+    import numpy as np
+
+    pos = np.searchsorted(sorted_times, targets, side="left")
+    left = np.clip(pos - 1, 0, len(sorted_times) - 1)
+    right = np.clip(pos, 0, len(sorted_times) - 1)
+    choose_left = np.abs(targets - sorted_times[left]) <= np.abs(sorted_times[right] - targets)
+    return np.where(choose_left, left, right)
+
+def align_sensor_streams(frames, reference, rate_hz=None):
+    """여러 장치 스트림을 하나의 시간축으로 정렬해 장치별 접두사가 붙은 표로 합칩니다.
+
+    frames 는 장치 이름 → Timestamp 열이 있는 DataFrame (순서대로 열이 배치됨),
+    reference 는 기준 시계로 쓸 장치 이름입니다. rate_hz 를 주면 기준 장치의 시각 대신
+    공통 구간의 균일한 시간축(rate_hz)을 사용합니다. 각 장치의 값은 기준 시각마다
+    가장 가까운 샘플로 채우며, 모든 입력을 한 번씩만 정렬/검색합니다.
+    """
+    import numpy as np
+    import pandas as pd
+
+    times = {name: df["Timestamp"].to_numpy("datetime64[ns]").astype(np.int64) for name, df in frames.items()}
+    ref_times = times[reference]
+
+    # 1. 공통 구간 결정: 각 장치 시작 시각과 가장 가까운 기준 시각 (장치보다 늦으면 장치 시작 시각)
+    # (장치별 후보 샘플은 자기 시작 시각부터, 기준 시간축은 모든 장치가 시작한 뒤부터)
+    stream_starts = {}
+    for name, t in times.items():
+        if name == reference:
+            continue
+        first = t.min()
+        closest = ref_times[np.argmin(np.abs(ref_times - first))]
+        print(f"{name} 첫 타임스탬프와 가장 가까운 {reference} 타임스탬프 차이: {(closest - first) / 1e9:.3f}초")
+        stream_starts[name] = closest if closest <= first else first
+    start = max(stream_starts.values()) if stream_starts else ref_times.min()
+    stream_starts[reference] = start
+    end = min(t.max() for t in times.values())
+
+    # 2. 기준 시간축
+    if rate_hz:
+        step = int(round(1e9 / rate_hz))
+        clock = np.arange(start, end + 1, step, dtype=np.int64)
+        ref_rows = None
+    else:
+        in_range = (ref_times >= start) & (ref_times <= end)
+        clock = ref_times[in_range]
+        ref_rows = np.flatnonzero(in_range)
+
+    # 3. 장치별 가장 가까운 샘플 매핑 (공통 구간 안의 샘플만 후보)
+    columns = [pd.DataFrame({"Timestamp": pd.to_datetime(clock)})]
+    for name, df in frames.items():
+        values = df.drop(columns="Timestamp")
+        t = times[name]
+        if name == reference and ref_rows is not None:
+            picked = values.iloc[ref_rows]
+        else:
+            candidates = np.flatnonzero((t >= stream_starts[name]) & (t <= end))
+            if len(candidates) == 0:
+                candidates = np.arange(len(t))
+            order = candidates[np.argsort(t[candidates], kind="stable")]
+            picked = values.iloc[order[_nearest_indices(t[order], clock)]]
+        picked = picked.reset_index(drop=True).add_prefix(f"{name}_")
+        columns.append(picked)
+        print(f"{name}: {len(df)}행 → {len(clock)}행에 정렬")
+
+    return pd.concat(columns, axis=1)
+
+def merge_session_files(stream_files, reference="DOT", rate_hz=None):
+    """장치 이름 → CSV 경로로 주어진 세션 파일들을 한 번에 정렬/병합하고 원본을 raw 로 옮깁니다."""
+    import pandas as pd
+
     try:
         # 기존 파일 존재 확인
-        if not os.path.exists(watch_file) or not os.path.exists(dot_file):
-            print(f"병합 실패: 파일이 누락되었습니다. ({watch_file} 또는 {dot_file})")
+        missing = [path for path in stream_files.values() if not os.path.exists(path)]
+        if missing:
+            print(f"병합 실패: 파일이 누락되었습니다. ({', '.join(missing)})")
             return None
-        
-        # 1. 워치와 DOT 파일 읽기
-        watch_df = pd.read_csv(watch_file, parse_dates=['Timestamp'])
-        dot_df = pd.read_csv(dot_file, parse_dates=['Timestamp'])
-        
-        if watch_df.empty or dot_df.empty:
-            print("병합 실패: 데이터가 비어있습니다.")
+        if reference not in stream_files:
+            print(f"병합 실패: 기준 장치 {reference} 의 파일이 없습니다.")
             return None
-        
-        print(f"워치 데이터: {len(watch_df)}행, DOT 데이터: {len(dot_df)}행")
-        
-        # 2. 워치 데이터 첫 타임스탬프 확인
-        watch_first_timestamp = watch_df['Timestamp'].min()
-        print(f"워치 첫 타임스탬프: {watch_first_timestamp}")
-        
-        # 3. DOT 데이터에서 워치 첫 타임스탬프와 가장 가까운 시간 찾기
-        closest_dot_index = (dot_df['Timestamp'] - watch_first_timestamp).abs().idxmin()
-        closest_dot_timestamp = dot_df.loc[closest_dot_index, 'Timestamp']
-        print(f"워치 시작과 가장 가까운 DOT 타임스탬프: {closest_dot_timestamp}")
-        
-        # 시간 차이 계산 (디버깅 용도)
-        time_diff = (closest_dot_timestamp - watch_first_timestamp).total_seconds()
-        print(f"시간 차이: {time_diff:.3f}초")
-        
-        # 4. 워치 첫 타임스탬프 이후의 DOT 데이터만 필터링 
-        # (또는 워치 시작보다 약간 이전 시점으로 설정할 수도 있음)
-        start_time = closest_dot_timestamp
-        
-        # 만약 DOT 데이터가 워치보다 늦게 시작한다면, 워치 시작 시간을 사용
-        if closest_dot_timestamp > watch_first_timestamp:
-            start_time = watch_first_timestamp
-            
-        # 공통 종료 시간 결정
-        end_time = min(watch_df['Timestamp'].max(), dot_df['Timestamp'].max())
-        
-        # 5. 공통 구간으로 필터링
-        watch_df = watch_df[(watch_df['Timestamp'] >= start_time) & (watch_df['Timestamp'] <= end_time)]
-        dot_df = dot_df[(dot_df['Timestamp'] >= start_time) & (dot_df['Timestamp'] <= end_time)]
-        
-        print(f"공통 시간대 필터링 후: 워치 데이터 {len(watch_df)}행, DOT 데이터 {len(dot_df)}행")
-        
-        # 6. DOT 데이터의 타임스탬프를 인덱스로 설정
-        dot_df.set_index('Timestamp', inplace=True)
-        
-        # 결과 데이터프레임 초기화 (DOT 데이터 기준)
-        result_df = pd.DataFrame(index=dot_df.index)
-        
-        # DOT 데이터 열 추가 (접두사 붙임)
-        for col in dot_df.columns:
-            result_df[f'DOT_{col}'] = dot_df[col]
-        
-        # 7. 가장 가까운 워치 데이터 찾기
-        print("가장 가까운 워치 데이터 매핑 중...")
-        
-        # 워치 데이터 결과물 준비
-        watch_result = pd.DataFrame(index=result_df.index)
-        
-        # 번거롭지만 모든 DOT 타임스탬프에 대해 가장 가까운 워치 데이터 찾기
-        for timestamp in result_df.index:
-            # 가장 가까운 워치 데이터 찾기
-            closest_idx = (watch_df['Timestamp'] - timestamp).abs().idxmin()
-            closest_row = watch_df.loc[closest_idx]
-            
-            # 워치 데이터의 모든 열을 추가
-            for col in watch_df.columns:
-                if col != 'Timestamp':
-                    watch_result.loc[timestamp, f'Watch_{col}'] = closest_row[col]
-        
-        # 8. 두 결과를 병합
-        result_df = result_df.join(watch_result)
-        
-        # 타임스탬프를 열로 복원
-        result_df.reset_index(inplace=True)
-        result_df.rename(columns={'index': 'Timestamp'}, inplace=True)
-        
-        # 9. 결과 파일 저장
-        base_dir = os.path.dirname(watch_file)
-        session_num = os.path.basename(watch_file).split('_')[0]
+
+        # 1. 모든 장치 파일을 한 번씩만 읽기 (기준 장치를 맨 앞에)
+        names = sorted(stream_files, key=lambda name: name != reference)
+        frames = {}
+        for name in names:
+            df = pd.read_csv(stream_files[name], parse_dates=['Timestamp'])
+            df = df.dropna(subset=['Timestamp'])
+            if df.empty:
+                if name.startswith(reference):
+                    # 같은 종류의 장치(DOT, DOT1 ...)는 일부만 기록될 수 있음 - 빈 스트림만 제외
+                    print(f"{name} 데이터가 비어있어 병합에서 제외합니다.")
+                    continue
+                print(f"병합 실패: {name} 데이터가 비어있습니다.")
+                return None
+            frames[name] = df
+
+        # 기준 장치가 비었으면 (모든 DOT 가 DOT1: 등 번호 접두어로 온 경우) 첫 번째 같은 종류 장치를 기준 시계로 사용
+        if reference not in frames:
+            fallback = next((name for name in frames if name.startswith(reference)), None)
+            if fallback is None:
+                print(f"병합 실패: {reference} 데이터가 비어있습니다.")
+                return None
+            print(f"{reference} 데이터가 비어있어 {fallback} 을 기준 시계로 사용합니다.")
+            reference = fallback
+        print("입력 데이터: " + ", ".join(f"{name} {len(df)}행" for name, df in frames.items()))
+
+        # 2. 단일 패스 정렬
+        result_df = align_sensor_streams(frames, reference, rate_hz)
+
+        # 3. 결과 파일 저장
+        first_file = next(iter(stream_files.values()))
+        base_dir = os.path.dirname(first_file)
+        session_num = os.path.basename(first_file).split('_')[0]
         merged_file = os.path.join(base_dir, f"{session_num}_merged.csv")
         result_df.to_csv(merged_file, index=False, date_format='%Y-%m-%d %H:%M:%S.%f')
-        
-        print(f"동기화 병합 완료: {merged_file} (타임라인 {len(result_df)}행)")
-        
-        # 10. 원본 파일을 raw 디렉토리로 이동
-        move_to_raw_directory(watch_file)
-        move_to_raw_directory(dot_file)
-        
+
+        print(f"동기화 병합 완료: {merged_file} (타임라인 {len(result_df)}행, 장치 {len(frames)}개)")
+
+        # 4. 원본 파일을 raw 디렉토리로 이동
+        for path in stream_files.values():
+            move_to_raw_directory(path)
+
         return merged_file
-        
+
     except Exception as e:
         import traceback
         print(f"파일 병합 중 오류 발생: {str(e)}")
         print(traceback.format_exc())  # 상세한 오류 내용 출력
         return None
 
+# 워치와 DOT 두 파일 병합 (DOT 시간축 기준, 열 접두사 DOT_/Watch_)
+def merge_sensor_files(watch_file, dot_file):
+    return merge_session_files({"DOT": dot_file, "Watch": watch_file}, reference="DOT")
+
+def ignore_sigint():
+    """작업 프로세스는 Ctrl+C 를 무시하고 서버 프로세스의 종료 절차를 따릅니다."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def get_merge_executor():
+    """병합 전용 작업 프로세스를 반환합니다. 서버 프로세스에는 pandas를 올리지 않습니다."""
+    global merge_executor
+    if merge_executor is None:
+        import multiprocessing
+
+        # spawn: 서버 프로세스 상태를 복사하지 않고 깨끗한 프로세스에서 병합
+        merge_executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=ignore_sigint,
+        )
+    return merge_executor
+
+
+async def run_merge(stream_files):
+    """병합을 작업 프로세스에서 실행해 이벤트 루프가 막히지 않게 합니다."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_merge_executor(), merge_session_files, stream_files
+        )
+    except Exception as e:
+        print(f"병합 작업 프로세스 오류: {e}")
+        return None
+
+def write_row(device, file_path, row):
+    """센서 행을 열 개수에 맞춰 CSV 에 추가하고 실시간 뷰어에게 넘깁니다."""
+    if file_path is None:
+        return
+    row = row.rstrip("\n")
+
+    # 데이터 검증: 워치 7개 열, DOT 14개 열 (타임스탬프 + 센서값)
+    n_columns = len(DEVICE_COLUMNS[device])
+    row_parts = row.split(',')
+    timestamp = sample_time(row, row_parts[0])
+    if timestamp is not None and is_duplicate(device, row):
+        return
+    if len(row_parts) > n_columns:
+        row = ','.join(row_parts[:n_columns])  # 앞쪽 열만 사용
+
+    with open(file_path, "a") as file:
+        file.write(row + "\n")
+    stream_hub.publish(device, row)
+    record_progress(device, timestamp)
+
+def time_value(value):
+    """타임스탬프/순번을 비교 가능한 float 로 바꿉니다. 알아볼 수 없으면 None.
+
+    숫자와 숫자 문자열(epoch 초, 순번)은 그대로, ISO 형식 날짜/시각 문자열은 epoch 초로
+    변환합니다 (시간대가 없으면 CSV 와 같이 서버 로컬 시각으로 봄).
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    try:
+        number = float(text)
+        return number if math.isfinite(number) else None
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def sample_time(row, first_field):
+    """행의 시각(time_value)을 반환합니다. 알아볼 수 없으면 None.
+
+    CSV 행은 첫 열 (DotRecording 의 t:<시각>,r:<값> 형식이면 t 값),
+    JSON 행(폰 클라이언트의 {"type": ..., "deviceId": ..., "timestamp": ...})은 timestamp 필드를 사용합니다.
+    """
+    if row.startswith("{"):
+        try:
+            payload = json.loads(row)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+        return time_value(payload.get("timestamp"))
+
+    timestamp = time_value(first_field)
+    if timestamp is None:
+        # t:<시각> 형식 (앞에 DOT: 접두어가 한 번 더 붙어 오기도 함)
+        name, _, value = first_field.rpartition(":")
+        if name == "t" or name.endswith(":t"):
+            timestamp = time_value(value)
+    return timestamp
+
+def is_duplicate(device, key):
+    """같은 장치에서 최근에 받은 행과 똑같으면 중복으로 세고 True 를 반환합니다."""
+    window = recent_samples.get(device)
+    if window is None:
+        window = recent_samples[device] = (deque(), set())
+    order, seen = window
+    if key in seen:
+        duplicate_counts[device] = duplicate_counts.get(device, 0) + 1
+        return True
+    order.append(key)
+    seen.add(key)
+    if len(order) > DEDUP_WINDOW:
+        seen.discard(order.popleft())
+    return False
+
+def record_progress(device, timestamp):
+    """장치별 수신 진행 상황을 갱신하고 종료 대기 중인 작업이 있으면 깨웁니다."""
+    global last_row_time
+    if timestamp is None:
+        untimed_streams.add(device)
+    elif timestamp > stream_progress.get(device, -math.inf):
+        stream_progress[device] = timestamp
+    last_row_time = time.monotonic()
+    if finalize_task is not None:
+        data_arrived.set()
+
+def mark_reached(device, mark):
+    """장치가 보고한 마지막 샘플(mark)까지 수신했는지 확인합니다."""
+    received = stream_progress.get(device)
+    return received is not None and mark is not None and received >= mark
+
+def mark_checkable(device, mark):
+    """마크를 수신 진행 상황과 비교할 수 있는지 확인합니다.
+
+    마크를 해석할 수 없거나, 장치 행이 모두 시각을 알아볼 수 없는 형식이면 비교할 수 없습니다.
+    """
+    return mark is not None and (device in stream_progress or device not in untimed_streams)
+
+def set_drain_mark(device, mark):
+    """장치의 마지막 샘플 마크를 기록합니다."""
+    value = time_value(mark)
+    if value is None:
+        print(f"{device} 종료 마크를 해석할 수 없습니다 ({mark!r}) - 수신이 멈출 때까지 대기")
+    drain_marks[device.upper()] = value
+
+def parse_end_marks(payload):
+    """SESSION_END 뒤의 JSON 페이로드를 장치 → 마지막 타임스탬프 딕셔너리로 변환합니다."""
+    if not payload.strip():
+        return {}
+    try:
+        marks = json.loads(payload)
+    except ValueError as e:
+        print(f"세션 종료 마크 해석 실패 (무시): {e}")
+        return {}
+    if not isinstance(marks, dict):
+        print(f"세션 종료 마크 형식 오류 (무시): {payload}")
+        return {}
+    return {device.upper(): mark for device, mark in marks.items()}
+
+async def wait_for_drain():
+    """모든 스트림이 보고된 마크까지 도착하거나, 마크가 없으면 데이터가 멈출 때까지 기다립니다.
+
+    비교할 수 없는 마크(mark_checkable)만 남으면 마크가 없을 때처럼 데이터가 멈출 때까지
+    기다립니다. SESSION_END_TIMEOUT 이 지나면 대기를 포기하고 False 를 반환합니다.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SESSION_END_TIMEOUT
+    end_received = time.monotonic()
+    while True:
+        checkable = {d: m for d, m in drain_marks.items() if mark_checkable(d, m)}
+        if not all(mark_reached(d, m) for d, m in checkable.items()):
+            wait = deadline - loop.time()
+        elif drain_marks and len(checkable) == len(drain_marks):
+            return True
+        else:
+            idle = time.monotonic() - max(last_row_time, end_received)
+            if idle >= SESSION_END_QUIET:
+                return True
+            wait = min(deadline - loop.time(), SESSION_END_QUIET - idle)
+
+        if deadline - loop.time() <= 0:
+            return False
+        data_arrived.clear()
+        try:
+            await asyncio.wait_for(data_arrived.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+async def finish_session():
+    """수신이 끝날 때까지 기다린 뒤 세션 파일을 병합하고 세션을 닫습니다."""
+    global current_watch_file, current_dot_file, session_active, finalize_task
+    started = time.monotonic()
+    try:
+        drained = await wait_for_drain()
+        waited = time.monotonic() - started
+        if drained:
+            print(f"모든 스트림 수신 완료 ({waited:.2f}초 대기) - 파일 종료")
+        else:
+            missing = {d: m for d, m in drain_marks.items() if not mark_reached(d, m)}
+            print(
+                f"세션 종료 대기 시간 초과 ({waited:.2f}초) - 미도착 스트림: {missing or '없음'}, "
+                f"수신 상태: {stream_progress}"
+            )
+        if duplicate_counts:
+            print(f"재전송 중복 행 제거: {duplicate_counts}")
+
+        # 세션 종료 전 파일 병합 작업 수행
+        watch_file = current_watch_file
+        dot_file = current_dot_file
+        # 열 접두사: DOT_, DOT1_, DOT2_ ..., Watch_ (DOT 시간축 기준)
+        stream_files = {"DOT": dot_file, **extra_device_files, "Watch": watch_file}
+        current_watch_file = None
+        current_dot_file = None
+        extra_device_files.clear()
+        session_active = False  # 세션 비활성화 플래그 설정
+
+        # 파일을 닫은 뒤 병합 시도
+        if watch_file and dot_file:
+            print(f"세션 파일 병합 작업 시작... ({', '.join(stream_files)})")
+            merged_file = await run_merge(stream_files)
+            if merged_file:
+                print(f"병합 파일 생성 완료: {merged_file}")
+            else:
+                print("병합 실패: 작업을 완료할 수 없습니다.")
+    finally:
+        drain_marks.clear()
+        stream_progress.clear()
+        untimed_streams.clear()
+        recent_samples.clear()
+        duplicate_counts.clear()
+        finalize_task = None
+
 async def handle_connection(websocket, path=None):
-    global current_watch_file, current_dot_file, session_active
+    global finalize_task
     async for message in websocket:
+        if message.startswith("SUBSCRIBE:"):
+            if session_allocator is not None:
+                # 다중 워커 모드: 이 워커에 배정된 장비만 보이므로 구독을 받지 않음
+                print("다중 워커 모드에서는 실시간 뷰어 구독을 지원하지 않습니다.")
+                await websocket.send(
+                    json.dumps({"type": "error", "message": "다중 워커 모드(--workers > 1)에서는 실시간 뷰어를 지원하지 않습니다."})
+                )
+                return
+            # 뷰어 연결: 이후 이 연결은 구독 전용으로 사용
+            await stream_hub.serve_subscriber(websocket, message[10:])
+            return
         print(f"수신 메시지: {message}")
         if message == "SESSION_START":
+            # 이전 세션이 아직 마무리 중이면 끝날 때까지 기다림
+            if finalize_task is not None:
+                await finalize_task
             # 파일이 없으면 생성
             if current_watch_file is None and current_dot_file is None:
                 new_session_files()
-        elif message == "SESSION_END":
-            print("세션 종료 명령 수신 - 1초 대기 후 파일 종료")
-            await asyncio.sleep(1.5)
-            
-            # 세션 종료 전 파일 병합 작업 수행
-            watch_file = current_watch_file
-            dot_file = current_dot_file
-            
-            # 파일을 닫기 전에 병합 시도
-            if watch_file and dot_file:
-                print("세션 파일 병합 작업 시작...")
-                merged_file = merge_sensor_files(watch_file, dot_file)
-                if merged_file:
-                    print(f"병합 파일 생성 완료: {merged_file}")
-                else:
-                    print("병합 실패: 작업을 완료할 수 없습니다.")
-            
-            current_watch_file = None
-            current_dot_file = None
-            session_active = False  # 세션 비활성화 플래그 설정
-            
+        elif message.startswith("STREAM_END:"):
+            # 장치별 마지막 샘플 보고: STREAM_END:<장치>:<마지막 타임스탬프>
+            if not session_active:
+                # 세션이 없거나 이미 마무리된 뒤의 마크는 다음 세션 배리어에 섞이지 않도록 버림
+                print("활성 세션이 없습니다. 스트림 종료 마크를 무시합니다.")
+                continue
+            device, _, mark = message[11:].partition(":")
+            set_drain_mark(device, mark)
+            data_arrived.set()
+        elif message == "SESSION_END" or message.startswith("SESSION_END:"):
+            for device, mark in parse_end_marks(message[12:]).items():
+                set_drain_mark(device, mark)
+            if finalize_task is not None:
+                # 이미 마무리 중: 새로 받은 마크만 반영
+                data_arrived.set()
+            elif session_active:
+                print(f"세션 종료 명령 수신 - 스트림 수신 완료 대기 (마크: {drain_marks or '없음'})")
+                # 이 연결의 수신 루프는 계속 돌아야 하므로 별도 작업에서 마무리
+                finalize_task = asyncio.create_task(finish_session())
+            else:
+                drain_marks.clear()
+                print("활성 세션이 없습니다. 세션 종료 명령을 무시합니다.")
+
         elif not session_active:
             # 세션이 활성화되지 않았으면 데이터를 저장하지 않고 무시
             print("활성 세션이 없습니다. 수신된 데이터가 무시됩니다.")
@@ -265,66 +632,170 @@ async def handle_connection(websocket, path=None):
             # 기존 데이터 처리 코드 유지
             if message.startswith("WATCH:"):
                 # 워치 센서 데이터 저장 (접두어 제거)
-                if current_watch_file is not None:
-                    row = message[6:].rstrip("\n")  # "WATCH:" 제거
-                    
-                    # 데이터 검증: 워치 데이터는 7개 열로만 구성
-                    row_parts = row.split(',')
-                    if len(row_parts) > 7:  # 타임스탬프 + 6개 센서값
-                        row = ','.join(row_parts[:7])  # 앞 7개 열만 사용
-                    
-                    with open(current_watch_file, "a") as file:
-                        file.write(row + "\n")
+                write_row("WATCH", current_watch_file, message[6:])
             elif message.startswith("DOT:"):
                 # DOT 센서 데이터 저장 (접두어 제거)
-                if current_dot_file is not None:
-                    row = message[4:].rstrip("\n")  # "DOT:" 제거
-                    
-                    # 데이터 검증: DOT 데이터는 14개 열로만 구성
-                    row_parts = row.split(',')
-                    if len(row_parts) > 14:  # 타임스탬프 + 13개 센서값
-                        row = ','.join(row_parts[:14])  # 앞 14개 열만 사용
-                    
-                    with open(current_dot_file, "a") as file:
-                        file.write(row + "\n")
+                write_row("DOT", current_dot_file, message[4:])
+            elif message.startswith("DOT") and message[3:4].isdigit():
+                # 추가 DOT 센서 데이터 (DOT1:, DOT2: ... 접두어)
+                device, _, row = message.partition(":")
+                write_row(device, extra_device_file(device), row)
             else:
-                # 기존 호환성 코드도 열 개수 검증 추가
+                # 기존 호환성 코드: 숫자로 시작하면 워치, 아니면 DOT 데이터로 간주
                 trimmed = message.lstrip()
                 if trimmed and trimmed[0].isdigit():
-                    # 워치 센서 데이터로 간주
-                    if current_watch_file is not None:
-                        row = message.rstrip("\n")
-                        row_parts = row.split(',')
-                        if len(row_parts) > 7:
-                            row = ','.join(row_parts[:7])
-                        with open(current_watch_file, "a") as file:
-                            file.write(row + "\n")
+                    write_row("WATCH", current_watch_file, message)
                 else:
-                    # DOT 센서 데이터로 간주
-                    if current_dot_file is not None:
-                        row = message.rstrip("\n")
-                        row_parts = row.split(',')
-                        if len(row_parts) > 14:
-                            row = ','.join(row_parts[:14])
-                        with open(current_dot_file, "a") as file:
-                            file.write(row + "\n")
-
-async def main():
+                    write_row("DOT", current_dot_file, message)
+
+async def main(host="0.0.0.0", port=5678, handoff=None, label="서버"):
     # raw 디렉토리 함수 호출
     ensure_raw_directory()
     
     ip_address = get_ip_address()
-    server = await websockets.serve(handle_connection, "0.0.0.0", 5678)
-    print(f"WebSocket server is running on ws://{ip_address}:5678")
-
     loop = asyncio.get_running_loop()
+    if handoff is not None:
+        # 다중 워커 모드: 외부 포트는 부모가 받고, 이 워커에는 연결된 소켓만 넘겨줌.
+        # websockets 서버는 넘겨받은 소켓에 붙일 연결 처리기를 만들기 위해 내부 주소에만 열어 둠.
+        server = await websockets.serve(handle_connection, "127.0.0.1", 0)
+        handoff.setblocking(False)
+        loop.add_reader(handoff.fileno(), receive_connection, handoff, server)
+    else:
+        server = await websockets.serve(handle_connection, host, port)
+    print(f"WebSocket server is running on ws://{ip_address}:{port} ({label}, pid {os.getpid()})")
+    report_startup(label, _STARTED_AT)
+
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, server.close)
 
     await server.wait_closed()
 
+    if finalize_task is not None:
+        await finalize_task
+    if merge_executor is not None:
+        merge_executor.shutdown(wait=True)
+
+def receive_connection(handoff, server):
+    """부모가 넘긴 연결 소켓을 받아 이 워커의 웹소켓 서버에 붙입니다."""
+    loop = asyncio.get_running_loop()
+    try:
+        _, fds, _, _ = socket.recv_fds(handoff, 1, 1)
+    except (BlockingIOError, InterruptedError):
+        return
+    if not fds:
+        # 부모 프로세스가 종료되어 채널이 닫힘
+        loop.remove_reader(handoff.fileno())
+        return
+    sock = socket.socket(fileno=fds[0])
+    sock.setblocking(False)
+    loop.create_task(adopt_connection(sock, server))
+
+async def adopt_connection(sock, server):
+    """연결된 소켓을 websockets 서버가 직접 accept 한 것처럼 처리하게 합니다."""
+    loop = asyncio.get_running_loop()
+    try:
+        # asyncio.Server 가 보관한 websockets 연결 생성 함수 (serve() 의 설정이 그대로 적용됨)
+        await loop.connect_accepted_socket(server.server._protocol_factory, sock)
+    except OSError as e:
+        print(f"넘겨받은 연결 처리 실패: {e}")
+        sock.close()
+
+def run_worker(worker_id, allocator, port, handoff):
+    """워커 프로세스 진입점: 자신의 연결, 세션 파일, 병합 프로세스를 따로 가짐."""
+    global session_allocator
+    session_allocator = allocator
+    try:
+        asyncio.run(main(port=port, handoff=handoff, label=f"서버 워커 {worker_id}"))
+    except KeyboardInterrupt:
+        pass
+
+def stop_workers(workers):
+    """살아 있는 워커들에게 SIGINT 로 종료를 알립니다."""
+    for worker in workers:
+        if worker.is_alive():
+            os.kill(worker.pid, signal.SIGINT)
+
+def serve_workers(n_workers, host="0.0.0.0", port=5678):
+    """n_workers 개의 프로세스로 같은 포트를 나눠 받습니다.
+
+    부모 프로세스가 외부 포트에서 accept 만 하고, 연결한 장비의 주소별로 정한 워커에게
+    연결 소켓 자체를 넘깁니다 (유닉스 소켓 fd 전달). 이후 데이터는 워커가 직접 읽으므로
+    부모는 연결마다 한 번만 관여합니다. 폰 클라이언트는 끊기면 같은 주소에서 다시 연결하므로
+    SESSION_START 이후의 재연결 데이터도 같은 워커의 세션에 기록됩니다.
+
+    장비 구분은 접속 주소로만 하므로, 같은 NAT/공유기 뒤나 같은 호스트에서 접속하는
+    장비들은 모두 한 워커로 모입니다. 세션은 워커별로 관리되므로 한 녹화 장비의 모든
+    스트림은 같은 주소(폰 한 대)에서 보내야 합니다. 실시간 뷰어(SUBSCRIBE)는 한 워커의
+    장비만 볼 수 있어 이 모드에서는 거절합니다.
+    """
+    import multiprocessing
+
+    ensure_raw_directory()
+    ctx = multiprocessing.get_context("spawn")
+    allocator = ctx.Value("i", get_next_session_number() - 1)
+
+    # 워커별 연결 전달 채널 (부모 쪽, 워커 쪽)
+    channels = [socket.socketpair() for _ in range(n_workers)]
+    workers = [
+        ctx.Process(target=run_worker, args=(i + 1, allocator, port, worker_end))
+        for i, (_, worker_end) in enumerate(channels)
+    ]
+    for worker in workers:
+        worker.start()
+    for _, worker_end in channels:
+        worker_end.close()
+
+    listener = socket.create_server((host, port), backlog=128)
+    # SIGTERM 도 Ctrl+C 와 같은 종료 절차를 따름
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"다중 워커 모드: 워커 {n_workers}개, 장비 주소별 워커 고정 (연결 소켓 전달)")
+    print(f"WebSocket server is running on ws://{get_ip_address()}:{port} (연결 분배, pid {os.getpid()})")
+
+    rig_workers = {}  # 장비 주소 → 워커 번호 (처음 본 장비부터 돌아가며 배정)
+    try:
+        while True:
+            client, address = listener.accept()
+            rig = address[0]
+            index = rig_workers.get(rig)
+            if index is None:
+                index = rig_workers[rig] = len(rig_workers) % n_workers
+                print(f"녹화 장비 {rig} → 워커 {index + 1}")
+            try:
+                socket.send_fds(channels[index][0], [b"C"], [client.fileno()])
+            except OSError as e:
+                print(f"워커 {index + 1} 에 연결 전달 실패 ({rig}): {e}")
+            finally:
+                # 워커가 자신의 복사본을 가지므로 부모 쪽 소켓은 바로 닫음
+                client.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        # 워커들에게 종료를 알리고 진행 중인 세션 마무리를 기다림
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        stop_workers(workers)
+        for worker in workers:
+            worker.join()
+        for parent_end, _ in channels:
+            parent_end.close()
+        print("서버가 종료되었습니다.")
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="센서 데이터 수신 웹소켓 서버")
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="수신 워커 프로세스 수 (2 이상이면 장비 주소별로 워커를 나누며 실시간 뷰어는 지원하지 않음)",
+    )
+    args = parser.parse_args()
+
     try:
-        asyncio.run(main())
+        if args.workers > 1:
+            serve_workers(args.workers, port=args.port)
+        else:
+            asyncio.run(main(port=args.port))
     except KeyboardInterrupt:
-        print("서버가 종료되었습니다.")
\ No newline at end of file
+        print("서버가 종료되었습니다.")
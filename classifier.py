@@ -1,13 +1,20 @@
-import pandas as pd
+import time
+
+_STARTED_AT = time.perf_counter()
+
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-from scipy.spatial.distance import euclidean
-from fastdtw import fastdtw
 
+from runtime_stats import profiler, report_startup
+
+# pandas, matplotlib, scipy, fastdtw 는 무거우므로 사용하는 함수 안에서 불러옴
 
+
+@profiler.stage("load_data")
 def load_data(file_path):
     """CSV 파일을 로드합니다."""
+    import pandas as pd
+
     try:
         data = pd.read_csv(file_path)
         print(f"파일 불러오기 성공: {file_path}")
@@ -18,6 +25,7 @@ def load_data(file_path):
         return None
 
 
+@profiler.stage("extract_time_series")
 def extract_time_series(data):
     """시계열 특징을 추출합니다. 바리에이션에 강건한 특징 위주로 추출합니다."""
     # DOT 센서 데이터 찾기
@@ -177,11 +185,12 @@ def collect_reference_data(folder_path):
                 file_path = os.path.join(motion_path, file)
                 print(f"파일 처리 중: {file}")
 
-                data = load_data(file_path)
-                if data is not None:
-                    # 시계열 데이터 추출
-                    time_series = extract_time_series(data)
-                    reference_data[motion_id].append(time_series)
+                with profiler.file(file_path):
+                    data = load_data(file_path)
+                    if data is not None:
+                        # 시계열 데이터 추출
+                        time_series = extract_time_series(data)
+                        reference_data[motion_id].append(time_series)
 
         # 세션 파일에서 찾기
         else:
@@ -196,11 +205,12 @@ def collect_reference_data(folder_path):
                 file_path = os.path.join(folder_path, file)
                 print(f"파일 처리 중: {file}")
 
-                data = load_data(file_path)
-                if data is not None:
-                    # 시계열 데이터 추출
-                    time_series = extract_time_series(data)
-                    reference_data[motion_id].append(time_series)
+                with profiler.file(file_path):
+                    data = load_data(file_path)
+                    if data is not None:
+                        # 시계열 데이터 추출
+                        time_series = extract_time_series(data)
+                        reference_data[motion_id].append(time_series)
 
     # 참조 데이터가 비어있는 동작 제외
     empty_motions = [k for k, v in reference_data.items() if not v]
@@ -214,8 +224,14 @@ def collect_reference_data(folder_path):
     return reference_data
 
 
+@profiler.stage("dtw_distance")
 def dtw_distance(ts1, ts2):
     """두 시계열 간의 DTW 거리를 계산합니다."""
+    from scipy.spatial.distance import euclidean
+    from fastdtw import fastdtw
+
+    # 전체 DTW 행렬 기준 셀 수 (fastdtw 는 이보다 적게 계산함)
+    profiler.count("dtw_cells", len(ts1) * len(ts2))
     try:
         distance, _ = fastdtw(ts1, ts2, dist=euclidean)
         return distance
@@ -224,6 +240,7 @@ def dtw_distance(ts1, ts2):
         return float("inf")  # 오류 발생 시 무한대 거리 반환
 
 
+@profiler.stage("normalize_time_series")
 def normalize_time_series(ts):
     """시계열 데이터를 정규화합니다."""
     mean = np.mean(ts, axis=0)
@@ -232,35 +249,55 @@ def normalize_time_series(ts):
     return (ts - mean) / std
 
 
+# 시계열 유형별 가중치 - 각 동작 고유의 특성을 더 잘 반영하도록 조정
+TYPE_WEIGHTS = {
+    "gyro_pattern": 1.2,  # 중요도 상향 (1.0 -> 1.2)
+    "gyro_smooth": 0.9,
+    "euler_relative": 1.1,  # 중요도 상향 (0.95 -> 1.1) - 손목 젖힘/회전 구분에 중요
+    "roll_pitch": 1.1,  # 중요도 상향 (0.95 -> 1.1) - 2번 3번 구분에 필수
+    "acc_direction": 0.9,
+    "euler_diff": 0.9,  # 중요도 상향 (0.8 -> 0.9)
+    "gyro_diff": 0.9,  # 중요도 상향 (0.8 -> 0.9)
+    "gyro": 0.7,
+    "acc_relative": 0.6,
+}
+
+# 동작별 패널티 가중치 조정
+MOTION_WEIGHTS = {
+    1: 0.8,  # 동작 1에 유리한 가중치 (기본 형태를 더 쉽게 인식)
+    2: 1.0,  # 동작 2는 중립적 가중치
+    3: 1.0,  # 동작 3은 중립적 가중치
+    4: 0.9,  # 동작 4는 약간 유리하게 (손목 굽힘 동작이 잘 인식되도록)
+    5: 1.0,  # 동작 5는 중립적 가중치
+    6: 1.0,  # 동작 6은 중립적 가중치
+    7: 1.0,  # 동작 7은 중립적 가중치 (이전에 불리했으나 조정)
+}
+
+# 패턴 유사성 점수 계산에 쓰이는 시계열 유형
+PATTERN_TYPES = ["gyro_pattern", "acc_direction", "euler_relative"]
+
+# 거리 차이가 이 비율 이내면 신뢰도가 높은 동작을 선택
+CONFIDENCE_RATIO = 1.2
+
+
+@profiler.stage("classify_with_dtw")
 def classify_with_dtw(
-    test_time_series, reference_data, use_normalized=True, weigh_by_type=True
+    test_time_series,
+    reference_data,
+    use_normalized=True,
+    weigh_by_type=True,
+    type_weights=None,
+    motion_weights=None,
+    confidence_ratio=CONFIDENCE_RATIO,
 ):
     """DTW를 사용하여 테스트 데이터를 분류합니다. 고유 동작 특성에 맞게 가중치 조정."""
     min_distances = {}
 
-    # 시계열 유형별 가중치 - 각 동작 고유의 특성을 더 잘 반영하도록 조정
-    type_weights = {
-        "gyro_pattern": 1.2,  # 중요도 상향 (1.0 -> 1.2)
-        "gyro_smooth": 0.9,
-        "euler_relative": 1.1,  # 중요도 상향 (0.95 -> 1.1) - 손목 젖힘/회전 구분에 중요
-        "roll_pitch": 1.1,  # 중요도 상향 (0.95 -> 1.1) - 2번 3번 구분에 필수
-        "acc_direction": 0.9,
-        "euler_diff": 0.9,  # 중요도 상향 (0.8 -> 0.9)
-        "gyro_diff": 0.9,  # 중요도 상향 (0.8 -> 0.9)
-        "gyro": 0.7,
-        "acc_relative": 0.6,
-    }
-
-    # 동작별 패널티 가중치 조정
-    motion_weights = {
-        1: 0.8,  # 동작 1에 유리한 가중치 (기본 형태를 더 쉽게 인식)
-        2: 1.0,  # 동작 2는 중립적 가중치
-        3: 1.0,  # 동작 3은 중립적 가중치
-        4: 0.9,  # 동작 4는 약간 유리하게 (손목 굽힘 동작이 잘 인식되도록)
-        5: 1.0,  # 동작 5는 중립적 가중치
-        6: 1.0,  # 동작 6은 중립적 가중치
-        7: 1.0,  # 동작 7은 중립적 가중치 (이전에 불리했으나 조정)
-    }
+    # 가중치를 지정하지 않으면 기본값 사용 (weight_tuner.py 결과를 넘길 수 있음)
+    if type_weights is None:
+        type_weights = TYPE_WEIGHTS
+    if motion_weights is None:
+        motion_weights = MOTION_WEIGHTS
 
     # 신뢰도 정보 저장
     confidence_scores = {}
@@ -294,11 +331,10 @@ def classify_with_dtw(
             # 가중 평균 계산
             if type_distances:
                 # 패턴 유사성 점수 (특징적 패턴 유형에 대한 일치도)
-                pattern_types = ["gyro_pattern", "acc_direction", "euler_relative"]
                 pattern_score = 0
-                if any(t in type_distances for t in pattern_types):
+                if any(t in type_distances for t in PATTERN_TYPES):
                     pattern_dists = [
-                        type_distances[t] for t in pattern_types if t in type_distances
+                        type_distances[t] for t in PATTERN_TYPES if t in type_distances
                     ]
                     pattern_score = 1.0 / (1.0 + np.mean(pattern_dists))
                 pattern_match_scores.append(pattern_score)
@@ -354,7 +390,7 @@ def classify_with_dtw(
             best_distance = min(min_distances.items(), key=lambda x: x[1])
 
             # 거리 차이가 20% 이내면 신뢰도가 높은 것 선택
-            if min_distances[best_confidence[0]] < best_distance[1] * 1.2:
+            if min_distances[best_confidence[0]] < best_distance[1] * confidence_ratio:
                 best_motion_id = best_confidence[0]
                 print(
                     f"신뢰도 기반 선택: 동작 {best_motion_id} (신뢰도: {best_confidence[1]:.4f})"
@@ -376,41 +412,35 @@ def classify_with_dtw(
     return 1, "기본 형태 (참조 데이터 없음)"
 
 
-def visualize_time_series(time_series, title="시계열 데이터"):
-    """시계열 데이터를 시각화합니다."""
-    types = [t for t in time_series.keys() if t != "length"]  # 'length' 키 제외
-    n_types = len(types)
-
-    if n_types == 0:
-        print("시각화할 시계열 데이터가 없습니다.")
-        return
-
-    fig, axes = plt.subplots(n_types, 1, figsize=(12, 4 * n_types))
-
-    if n_types == 1:
-        axes = [axes]
+def visualize_time_series(time_series, title="시계열 데이터", out_dir="."):
+    """시계열 데이터를 시각화해 PNG 파일로 저장합니다 (비대화형 백엔드, 픽셀 폭 기준 데시메이션)."""
+    from report_renderer import render_time_series
 
-    for i, ts_type in enumerate(types):
-        data = time_series[ts_type]
-        n_dims = data.shape[1]
-
-        for dim in range(n_dims):
-            axes[i].plot(data[:, dim], label=f"차원 {dim+1}")
-
-        axes[i].set_title(f"{ts_type} 데이터")
-        axes[i].set_xlabel("시간")
-        axes[i].set_ylabel("값")
-        axes[i].legend()
-        axes[i].grid(True, alpha=0.3)
-
-    plt.suptitle(title)
-    plt.tight_layout()
-    # plt.savefig(f"{title.replace(' ', '_')}.png")
-    # print(f"{title} 시각화가 저장되었습니다.")
+    out_base = os.path.join(out_dir, title.replace(" ", "_"))
+    written = render_time_series(time_series, title, out_base)
+    if written:
+        print(f"{title} 시각화가 저장되었습니다: {written[0]}")
+    return written
 
 
 if __name__ == "__main__":
-    folder_path = "/Users/yoosehyeok/Documents/RecordingData"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DTW 기반 동작 분류")
+    parser.add_argument("--folder", default="/Users/yoosehyeok/Documents/RecordingData")
+    parser.add_argument("--report", default=None, help="그림과 index.html 을 저장할 폴더")
+    parser.add_argument("--report-format", nargs="+", default=["png"], choices=["png", "svg"])
+    parser.add_argument("--decimation", default="minmax", choices=["minmax", "lttb"])
+    parser.add_argument("--workers", type=int, default=None, help="그림 생성 프로세스 수")
+    parser.add_argument("--profile", action="store_true", help="단계별 실행 시간 측정")
+    parser.add_argument("--profile-report", default="classifier_profile.json", help="프로파일 JSON 경로")
+    parser.add_argument("--cprofile", default=None, help="cProfile 결과(.prof) 저장 경로")
+    args = parser.parse_args()
+
+    folder_path = args.folder
+    report_startup("분류기", _STARTED_AT)
+    if args.profile or args.cprofile:
+        profiler.start(cprofile_path=args.cprofile)
 
     # 1. 참조 데이터 수집
     print("== 참조 데이터 수집 중... ==")
@@ -478,37 +508,38 @@ if __name__ == "__main__":
             file_name = os.path.basename(test_file)
             print(f"\n===== 테스트 파일 #{index}: {file_name} =====")
 
-            # DTW 분류 실행
-            data = load_data(test_file)
-            if data is not None:
-                test_time_series = extract_time_series(data)
-                motion_id, motion_desc = classify_with_dtw(test_time_series, reference_data)
+            with profiler.file(test_file):
+                # DTW 분류 실행
+                data = load_data(test_file)
+                if data is not None:
+                    test_time_series = extract_time_series(data)
+                    motion_id, motion_desc = classify_with_dtw(test_time_series, reference_data)
 
-                # 결과 저장
-                test_results[file_name] = (motion_id, motion_desc, index)  # 인덱스도 함께 저장
-                print(f"DTW 분류 결과: 동작 {motion_id} ({motion_desc})")
+                    # 결과 저장
+                    test_results[file_name] = (motion_id, motion_desc, index)  # 인덱스도 함께 저장
+                    print(f"DTW 분류 결과: 동작 {motion_id} ({motion_desc})")
 
-                # 기본 특징값 표시
-                features = extract_features(data)
+                    # 기본 특징값 표시
+                    features = extract_features(data)
                 
-                # 중요 특징 그룹화하여 일부만 표시
-                print("\n== 주요 특징값 ==")
-                important_features = [
-                    "dot_gyro_z_sum",
-                    "dot_gyro_z_cumsum",
-                    "dot_pitch_change",
-                    "dot_pitch_end_diff",
-                    "dot_roll_change",
-                    "dot_roll_end_diff",
-                    "dot_yaw_change",
-                    "dot_yaw_end_diff",
-                ]
-
-                for feature in important_features:
-                    if feature in features:
-                        print(f"{feature}: {features[feature]:.4f}")
-            else:
-                print(f"파일을 로드할 수 없습니다: {test_file}")
+                    # 중요 특징 그룹화하여 일부만 표시
+                    print("\n== 주요 특징값 ==")
+                    important_features = [
+                        "dot_gyro_z_sum",
+                        "dot_gyro_z_cumsum",
+                        "dot_pitch_change",
+                        "dot_pitch_end_diff",
+                        "dot_roll_change",
+                        "dot_roll_end_diff",
+                        "dot_yaw_change",
+                        "dot_yaw_end_diff",
+                    ]
+
+                    for feature in important_features:
+                        if feature in features:
+                            print(f"{feature}: {features[feature]:.4f}")
+                else:
+                    print(f"파일을 로드할 수 없습니다: {test_file}")
 
         # 전체 결과 요약 - 테스트 순서대로 정렬
         print("\n\n========== 테스트 결과 요약 ==========")
@@ -518,7 +549,26 @@ if __name__ == "__main__":
         
         for file_name, (motion_id, motion_desc, index) in sorted_results:
             print(f"#{index:02d}: {file_name} - 동작 {motion_id} ({motion_desc})")
+
+        # 그림 보고서 생성 (여러 프로세스에서 병렬로 렌더링)
+        if args.report:
+            from report_renderer import render_report
+
+            print(f"\n== 보고서 생성 중: {args.report} ==")
+            render_report(
+                [(os.path.basename(f), f) for f in sorted_test_files],
+                args.report,
+                results={name: desc for name, (_, desc, _) in test_results.items()},
+                formats=args.report_format,
+                method=args.decimation,
+                workers=args.workers,
+            )
     else:
         print("테스트 파일을 찾을 수 없습니다.")
 
+    if profiler.enabled:
+        profiler.stop()
+        profiler.print_summary()
+        profiler.dump(args.profile_report)
+
     print("\n========== 분류 완료 ==========")
\ No newline at end of file
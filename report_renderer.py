@@ -0,0 +1,263 @@
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 그림 크기 (인치) 와 해상도 - 데시메이션 목표 점 수는 이 값으로 계산한 픽셀 폭에 맞춤
+FIGURE_WIDTH = 12
+PANEL_HEIGHT = 3
+DPI = 100
+
+
+def _pyplot():
+    """비대화형(Agg) 백엔드로 pyplot 을 불러옵니다."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    # 한글 라벨이 깨지지 않도록 설치된 한글 글꼴이 있으면 사용
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    for name in ("AppleGothic", "Apple SD Gothic Neo", "NanumGothic", "Malgun Gothic"):
+        if name in installed:
+            plt.rcParams["font.family"] = name
+            break
+    plt.rcParams["axes.unicode_minus"] = False
+    return plt
+
+
+def minmax_decimate(y, n_buckets):
+    """구간별 최소/최대값만 남겨 피크를 보존하며 점 수를 줄입니다. 선택된 인덱스를 반환합니다."""
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    bucket_size = -(-n // n_buckets)
+    n_full = -(-n // bucket_size)
+    padded = np.full(n_full * bucket_size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(n_full, bucket_size)
+
+    # NaN 은 최소/최대 후보에서 제외 (전부 NaN 인 구간은 첫 점이 선택되어 끊김으로 표시됨)
+    nan = np.isnan(blocks)
+    i_min = np.argmin(np.where(nan, np.inf, blocks), axis=1)
+    i_max = np.argmax(np.where(nan, -np.inf, blocks), axis=1)
+
+    base = np.arange(n_full) * bucket_size
+    first = base + np.minimum(i_min, i_max)
+    second = base + np.maximum(i_min, i_max)
+    indices = np.column_stack([first, second]).ravel()
+    indices = indices[indices < n]
+    # 최소와 최대가 같은 점이면 한 번만 사용
+    keep = np.ones(len(indices), dtype=bool)
+    keep[1:] = indices[1:] != indices[:-1]
+    return indices[keep]
+
+
+def lttb_decimate(x, y, n_out):
+    """Largest-Triangle-Three-Buckets 로 모양을 보존하며 점 수를 줄입니다. 선택된 인덱스를 반환합니다."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    indices = np.empty(n_out, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 다음 구간의 평균점
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # 이전 선택점 - 평균점과 만드는 삼각형 넓이가 가장 큰 점 선택
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def decimate(x, y, width_px, method="minmax"):
+    """픽셀 폭에 맞게 한 채널을 줄여 (x, y) 를 반환합니다."""
+    if method == "lttb":
+        indices = lttb_decimate(x, y, 2 * width_px)
+    else:
+        indices = minmax_decimate(y, width_px)
+    return x[indices], y[indices]
+
+
+def _plot_panels(panels, title, out_base, formats, method, xlabel="시간"):
+    """(패널 제목, x, {라벨: y}) 목록을 하나의 그림으로 그려 파일로 저장합니다."""
+    plt = _pyplot()
+    n_panels = len(panels)
+    width_px = FIGURE_WIDTH * DPI
+
+    fig, axes = plt.subplots(
+        n_panels, 1, figsize=(FIGURE_WIDTH, PANEL_HEIGHT * n_panels), dpi=DPI, squeeze=False
+    )
+    for ax, (panel_title, x, channels) in zip(axes[:, 0], panels):
+        for label, y in channels.items():
+            dx, dy = decimate(x, y, width_px, method)
+            ax.plot(dx, dy, label=label, linewidth=0.8)
+        ax.set_title(panel_title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel("값")
+        ax.legend(loc="upper right", fontsize="small")
+        ax.grid(True, alpha=0.3)
+
+    fig.suptitle(title)
+    fig.tight_layout()
+
+    written = []
+    for fmt in formats:
+        path = f"{out_base}.{fmt}"
+        fig.savefig(path, format=fmt)
+        written.append(path)
+    plt.close(fig)
+    return written
+
+
+def render_time_series(time_series, title, out_base, formats=("png",), method="minmax"):
+    """extract_time_series 결과(특징 유형별 시계열)를 그려 저장합니다."""
+    panels = []
+    for ts_type, data in time_series.items():
+        if ts_type == "length":
+            continue
+        x = np.arange(len(data))
+        channels = {f"차원 {dim + 1}": data[:, dim] for dim in range(data.shape[1])}
+        panels.append((f"{ts_type} 데이터", x, channels))
+
+    if not panels:
+        print("시각화할 시계열 데이터가 없습니다.")
+        return []
+    return _plot_panels(panels, title, out_base, formats, method)
+
+
+def render_recording(data, title, out_base, formats=("png",), method="minmax"):
+    """병합 CSV 의 원시 채널을 센서 그룹(DOT_Acc, Watch_Gyro 등)별로 그려 저장합니다."""
+    import pandas as pd
+
+    if "Timestamp" in data.columns:
+        timestamps = pd.to_datetime(data["Timestamp"], errors="coerce")
+        x = (timestamps - timestamps.iloc[0]).dt.total_seconds().to_numpy()
+    else:
+        x = np.arange(len(data), dtype=float)
+
+    groups = {}
+    for col in data.columns:
+        if col == "Timestamp" or not pd.api.types.is_numeric_dtype(data[col]):
+            continue
+        group = col.rsplit("_", 1)[0] if "_" in col else col
+        groups.setdefault(group, {})[col] = data[col].to_numpy(dtype=float)
+
+    if not groups:
+        print(f"시각화할 채널이 없습니다: {title}")
+        return []
+    panels = [(group, x, channels) for group, channels in groups.items()]
+    return _plot_panels(panels, title, out_base, formats, method, xlabel="시간 (초)")
+
+
+def _render_session(job):
+    """세션 하나의 원시 채널/특징 그림을 그립니다 (작업 프로세스용)."""
+    name, csv_path, out_dir, formats, method = job
+    from classifier import extract_time_series
+    import pandas as pd
+
+    stem = os.path.splitext(name)[0]
+    try:
+        data = pd.read_csv(csv_path)
+        images = render_recording(data, name, os.path.join(out_dir, f"{stem}_raw"), formats, method)
+        images += render_time_series(
+            extract_time_series(data),
+            f"{name} 특징",
+            os.path.join(out_dir, f"{stem}_features"),
+            formats,
+            method,
+        )
+        return name, [os.path.basename(p) for p in images], None
+    except Exception as e:
+        return name, [], str(e)
+
+
+def write_index(out_dir, rows, title="분류 결과 보고서"):
+    """(파일명, 분류 결과, 그림 목록, 오류) 행으로 index.html 요약 페이지를 작성합니다."""
+    counts = {}
+    for _, result, _, _ in rows:
+        if result is not None:
+            counts[result] = counts.get(result, 0) + 1
+
+    lines = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title>",
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+        "td,th{border:1px solid #ccc;padding:4px 8px;vertical-align:top}"
+        "img{max-width:480px}</style>",
+        "</head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        f"<p>생성 시각: {time.strftime('%Y-%m-%d %H:%M:%S')}, 파일 {len(rows)}개</p>",
+    ]
+
+    if counts:
+        lines.append("<h2>분류 요약</h2><table><tr><th>결과</th><th>개수</th></tr>")
+        for result, count in sorted(counts.items(), key=lambda item: str(item[0])):
+            lines.append(f"<tr><td>{html.escape(str(result))}</td><td>{count}</td></tr>")
+        lines.append("</table>")
+
+    lines.append("<h2>파일별 결과</h2><table><tr><th>#</th><th>파일</th><th>결과</th><th>그림</th></tr>")
+    for index, (name, result, images, error) in enumerate(rows, 1):
+        cells = [
+            f'<a href="{html.escape(image)}"><img src="{html.escape(image)}" loading="lazy"></a>'
+            for image in images
+            if not image.endswith(".svg") or not any(i.endswith(".png") for i in images)
+        ]
+        if error:
+            cells.append(f"<pre>{html.escape(error)}</pre>")
+        result_text = "-" if result is None else str(result)
+        lines.append(
+            f"<tr><td>{index}</td><td>{html.escape(name)}</td>"
+            f"<td>{html.escape(result_text)}</td><td>{''.join(cells)}</td></tr>"
+        )
+    lines.append("</table></body></html>")
+
+    index_path = os.path.join(out_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines))
+    return index_path
+
+
+def render_report(sessions, out_dir, results=None, formats=("png",), method="minmax", workers=None):
+    """여러 세션을 작업 프로세스에서 병렬로 그리고 index.html 을 작성합니다.
+
+    sessions 는 (이름, CSV 경로) 목록, results 는 이름 → 분류 결과 딕셔너리입니다.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = results or {}
+    jobs = [(name, path, out_dir, tuple(formats), method) for name, path in sessions]
+
+    start = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        rendered = [_render_session(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_session, jobs))
+
+    rows = []
+    for name, images, error in rendered:
+        if error:
+            print(f"그림 생성 실패 ({name}): {error}")
+        rows.append((name, results.get(name), images, error))
+
+    index_path = write_index(out_dir, rows)
+    print(f"보고서 작성 완료: {index_path} (세션 {len(jobs)}개, {time.perf_counter() - start:.1f}초)")
+    return index_path
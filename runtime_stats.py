@@ -0,0 +1,174 @@
+import contextlib
+import functools
+import json
+import resource
+import sys
+import time
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 상주 메모리(MB)를 반환합니다."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, 리눅스는 KB 단위로 보고함
+    if sys.platform == "darwin":
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def report_startup(label, started_at):
+    """시작 시점(time.perf_counter 값)부터 걸린 시간과 메모리 사용량을 출력합니다."""
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    heavy = [m for m in ("pandas", "matplotlib", "scipy", "fastdtw") if m in sys.modules]
+    print(
+        f"{label} 준비 완료: {elapsed_ms:.1f}ms, 메모리 {peak_rss_mb():.1f}MB, "
+        f"로드된 분석 모듈: {', '.join(heavy) if heavy else '없음'}"
+    )
+
+
+class StageProfiler:
+    """단계별 실행 시간(벽시계/CPU), 호출 횟수, 카운터를 파일별/전체로 집계합니다.
+
+    stage() 로 감싼 함수는 비활성 상태에서는 검사 한 번만 하고 그대로 실행됩니다.
+    단계가 중첩되면 전체 시간(wall, cpu)과 하위 단계를 뺀 자체 시간(self_wall,
+    self_cpu)을 함께 기록합니다.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+        self.files = {}
+        self._current = None
+        self._stack = []
+        self._started_at = None
+        self._cprofile = None
+        self._cprofile_path = None
+
+    def start(self, cprofile_path=None):
+        """프로파일링을 켭니다. cprofile_path 를 주면 cProfile 결과도 저장합니다."""
+        self.enabled = True
+        self._started_at = (time.perf_counter(), time.process_time())
+        if cprofile_path:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile_path = cprofile_path
+            self._cprofile.enable()
+
+    def stop(self):
+        """프로파일링을 끄고 cProfile 결과를 저장합니다."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self._cprofile_path)
+            print(f"cProfile 결과 저장: {self._cprofile_path}")
+            self._cprofile = None
+        self.enabled = False
+
+    def stage(self, name):
+        """함수를 name 단계로 기록하는 데코레이터."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                # [시작 wall, 시작 cpu, 하위 단계 wall, 하위 단계 cpu]
+                frame = [time.perf_counter(), time.process_time(), 0.0, 0.0]
+                self._stack.append(frame)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._stack.pop()
+                    wall = time.perf_counter() - frame[0]
+                    cpu = time.process_time() - frame[1]
+                    if self._stack:
+                        self._stack[-1][2] += wall
+                        self._stack[-1][3] += cpu
+                    self._record(name, wall, cpu, wall - frame[2], cpu - frame[3])
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name, amount=1):
+        """카운터(예: DTW 셀 수)를 증가시킵니다."""
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+        if self._current is not None:
+            counters = self._current["counters"]
+            counters[name] = counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def file(self, name):
+        """이 블록 안의 기록을 name 파일 항목에도 따로 집계합니다."""
+        if not self.enabled:
+            yield
+            return
+        entry = self.files.setdefault(name, {"wall": 0.0, "stages": {}, "counters": {}})
+        previous = self._current
+        self._current = entry
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["wall"] += time.perf_counter() - started
+            self._current = previous
+
+    def _record(self, name, wall, cpu, self_wall, self_cpu):
+        targets = [self.stages]
+        if self._current is not None:
+            targets.append(self._current["stages"])
+        for stages in targets:
+            stats = stages.get(name)
+            if stats is None:
+                stats = stages[name] = {
+                    "calls": 0, "wall": 0.0, "cpu": 0.0, "self_wall": 0.0, "self_cpu": 0.0,
+                }
+            stats["calls"] += 1
+            stats["wall"] += wall
+            stats["cpu"] += cpu
+            stats["self_wall"] += self_wall
+            stats["self_cpu"] += self_cpu
+
+    def report(self):
+        """기계가 읽을 수 있는 형태(딕셔너리)로 전체/파일별 결과를 반환합니다."""
+        wall = cpu = None
+        if self._started_at is not None:
+            wall = time.perf_counter() - self._started_at[0]
+            cpu = time.process_time() - self._started_at[1]
+        return {
+            "run": {
+                "wall": wall,
+                "cpu": cpu,
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": self.stages,
+                "counters": self.counters,
+            },
+            "files": self.files,
+        }
+
+    def dump(self, path):
+        """결과를 JSON 파일로 저장합니다."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2, ensure_ascii=False)
+        print(f"프로파일 보고서 저장: {path}")
+
+    def print_summary(self):
+        """자체 시간이 큰 순서로 단계별 요약을 출력합니다."""
+        report = self.report()["run"]
+        print("\n========== 단계별 실행 시간 ==========")
+        print(f"{'단계':<24}{'호출':>8}{'전체(s)':>10}{'자체(s)':>10}{'CPU(s)':>10}")
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["self_wall"]):
+            print(
+                f"{name:<24}{stats['calls']:>8}{stats['wall']:>10.3f}"
+                f"{stats['self_wall']:>10.3f}{stats['self_cpu']:>10.3f}"
+            )
+        for name, value in self.counters.items():
+            print(f"{name}: {value:,}")
+        if report["wall"] is not None:
+            print(f"총 실행 시간: {report['wall']:.3f}s (CPU {report['cpu']:.3f}s)")
+
+
+# 모듈 전역 프로파일러 (기본 비활성)
+profiler = StageProfiler()
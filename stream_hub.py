@@ -0,0 +1,226 @@
+import asyncio
+import json
+import time
+
+# 구독자 기본값
+DEFAULT_RATE = 30  # 장치별 초당 표시 샘플 수
+DEFAULT_FRAME_MS = 100  # 프레임 묶음 전송 주기
+MAX_QUEUED_FRAMES = 4  # 느린 구독자에게 쌓아둘 최대 프레임 수 (넘으면 오래된 프레임 버림)
+
+# 폰 클라이언트가 보내는 JSON 행의 type 별 필드 → CSV 열 이름
+# (목록에 없는 필드는 열 이름과 같은 키가 있으면 그 값을 사용)
+JSON_FIELDS = {
+    "dotSensorData": {"w": "Quat_W", "x": "Quat_X", "y": "Quat_Y", "z": "Quat_Z"},
+    "watch": {"r": "Euler_Roll", "p": "Euler_Pitch", "y": "Euler_Yaw"},
+}
+
+
+def _to_number(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return value
+
+
+def _row_values(row, columns, indices, width):
+    """원시 행을 [Timestamp, 선택 채널 값...] 으로 바꿉니다. 열 구성과 맞지 않는 행은 None."""
+    if row.startswith("{"):
+        try:
+            payload = json.loads(row)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict) or "timestamp" not in payload:
+            return None
+        fields = {column: key for key, column in JSON_FIELDS.get(payload.get("type"), {}).items()}
+        keys = [fields.get(column, column) for column in columns[1:]]
+        # 요청한 채널이 하나도 없는 메시지(ping 등)는 건너뜀
+        if not any(key in payload for key in keys):
+            return None
+        return [payload["timestamp"]] + [_to_number(payload.get(key)) for key in keys]
+
+    parts = row.split(",")
+    if len(parts) != width:
+        # 열 수가 다른 행은 값이 헤더와 어긋나므로 보내지 않음
+        return None
+    return [parts[0]] + [_to_number(parts[i]) for i in indices]
+
+
+class Subscriber:
+    """뷰어 웹소켓 하나의 구독 상태 (장치/채널 선택, 데시메이션, 프레임 큐)."""
+
+    def __init__(self, websocket, selections, rate, frame_ms):
+        self.websocket = websocket
+        # 장치 → (열 이름 목록, 원본 행에서의 열 인덱스 목록, 원본 행의 열 수)
+        self.selections = selections
+        self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        self.frame_interval = frame_ms / 1000.0
+        self.last_emit = {device: 0.0 for device in selections}
+        self.pending = {device: [] for device in selections}
+        self.frames = asyncio.Queue(maxsize=MAX_QUEUED_FRAMES)
+        self.dropped_frames = 0
+        self.sent_frames = 0
+        self.skipped_rows = 0
+
+    def offer(self, device, now, row):
+        """수신 루프에서 호출: 표시 주기가 지났을 때만 원본 행을 보관합니다 (파싱은 전송 시점에)."""
+        if now - self.last_emit[device] < self.min_interval:
+            return
+        self.last_emit[device] = now
+        self.pending[device].append(row)
+
+    def build_frame(self):
+        """보관된 행들을 하나의 JSON 프레임으로 묶습니다. 보낼 것이 없으면 None."""
+        streams = {}
+        for device, rows in self.pending.items():
+            if not rows:
+                continue
+            columns, indices, width = self.selections[device]
+            values = []
+            for row in rows:
+                parsed = _row_values(row, columns, indices, width)
+                if parsed is None:
+                    self.skipped_rows += 1
+                else:
+                    values.append(parsed)
+            self.pending[device] = []
+            if values:
+                streams[device] = {"columns": columns, "rows": values}
+
+        if not streams:
+            return None
+        return json.dumps(
+            {
+                "type": "frame",
+                "streams": streams,
+                "dropped": self.dropped_frames,
+                "skipped": self.skipped_rows,
+            }
+        )
+
+    def enqueue(self, frame):
+        """프레임을 전송 큐에 넣습니다. 큐가 가득 차면 가장 오래된 프레임을 버립니다."""
+        if self.frames.full():
+            self.frames.get_nowait()
+            self.dropped_frames += 1
+        self.frames.put_nowait(frame)
+
+
+class StreamHub:
+    """수신한 센서 행을 구독 중인 뷰어들에게 장치별로 줄여서 묶음 전송합니다.
+
+    수신 루프는 publish() 로 행 문자열만 넘기고 기다리지 않습니다. 파싱, JSON 변환,
+    전송은 구독자별 작업에서 처리되므로 느린 화면이 기록을 늦추지 않습니다.
+    """
+
+    def __init__(self):
+        self.device_columns = {}
+        self.subscribers = set()
+
+    def register_device(self, device, columns):
+        """장치 이름과 CSV 열 목록(Timestamp 포함)을 등록합니다."""
+        self.device_columns[device] = list(columns)
+
+    def publish(self, device, row):
+        """수신 루프에서 행마다 호출됩니다. 구독자가 없으면 바로 반환합니다."""
+        if not self.subscribers:
+            return
+        now = time.monotonic()
+        for subscriber in self.subscribers:
+            if device in subscriber.selections:
+                subscriber.offer(device, now, row)
+
+    def _parse_request(self, payload):
+        """SUBSCRIBE 요청(JSON)을 해석해 Subscriber 생성 인자를 만듭니다."""
+        request = json.loads(payload) if payload.strip() else {}
+        if not isinstance(request, dict):
+            raise ValueError("구독 요청은 JSON 객체여야 합니다")
+        devices = request.get("devices") or list(self.device_columns)
+        channels = request.get("channels") or []
+
+        selections = {}
+        for device in devices:
+            columns = self.device_columns.get(device)
+            if columns is None:
+                continue
+            wanted = [c for c in columns[1:] if not channels or c in channels]
+            indices = [columns.index(c) for c in wanted]
+            selections[device] = (["Timestamp"] + wanted, indices, len(columns))
+
+        rate = float(request.get("rate", DEFAULT_RATE))
+        frame_ms = float(request.get("frame_ms", DEFAULT_FRAME_MS))
+        return selections, rate, max(frame_ms, 10.0)
+
+    async def _flush_loop(self, subscriber):
+        """프레임 주기마다 보관된 행을 묶어 전송 큐에 넣습니다."""
+        while True:
+            await asyncio.sleep(subscriber.frame_interval)
+            frame = subscriber.build_frame()
+            if frame is not None:
+                subscriber.enqueue(frame)
+
+    async def _send_loop(self, subscriber):
+        """전송 큐의 프레임을 순서대로 보냅니다. 느린 구독자는 여기서만 기다립니다."""
+        while True:
+            frame = await subscriber.frames.get()
+            try:
+                await subscriber.websocket.send(frame)
+            except Exception:
+                # 연결이 끊기면 serve_subscriber 에서 정리됨
+                return
+            subscriber.sent_frames += 1
+
+    async def serve_subscriber(self, websocket, payload):
+        """뷰어 연결을 구독자로 등록하고 연결이 끊길 때까지 유지합니다.
+
+        같은 연결에서 SUBSCRIBE 를 다시 보내면 구독 조건을 바꿉니다.
+        """
+        try:
+            selections, rate, frame_ms = self._parse_request(payload)
+        except (ValueError, TypeError) as e:
+            await websocket.send(json.dumps({"type": "error", "message": f"잘못된 구독 요청: {e}"}))
+            return
+
+        subscriber = Subscriber(websocket, selections, rate, frame_ms)
+        self.subscribers.add(subscriber)
+        tasks = [
+            asyncio.create_task(self._flush_loop(subscriber)),
+            asyncio.create_task(self._send_loop(subscriber)),
+        ]
+        print(f"뷰어 구독 시작: {list(selections)} @ {rate:g}Hz (구독자 {len(self.subscribers)}명)")
+
+        try:
+            await websocket.send(
+                json.dumps(
+                    {
+                        "type": "subscribed",
+                        "streams": {d: cols for d, (cols, *_) in selections.items()},
+                        "rate": rate,
+                        "frame_ms": frame_ms,
+                    }
+                )
+            )
+            async for message in websocket:
+                if message.startswith("SUBSCRIBE:"):
+                    try:
+                        selections, rate, frame_ms = self._parse_request(message[10:])
+                    except (ValueError, TypeError) as e:
+                        print(f"구독 변경 요청 무시: {e}")
+                        continue
+                    subscriber.selections = selections
+                    subscriber.min_interval = 1.0 / rate if rate > 0 else 0.0
+                    subscriber.frame_interval = frame_ms / 1000.0
+                    subscriber.last_emit = {device: 0.0 for device in selections}
+                    subscriber.pending = {device: [] for device in selections}
+        except Exception as e:
+            print(f"뷰어 연결 종료: {e}")
+        finally:
+            self.subscribers.discard(subscriber)
+            for task in tasks:
+                task.cancel()
+            print(
+                f"뷰어 구독 종료: 전송 {subscriber.sent_frames}프레임, "
+                f"버림 {subscriber.dropped_frames}프레임, 형식 불일치 {subscriber.skipped_rows}행 "
+                f"(구독자 {len(self.subscribers)}명)"
+            )
@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from classifier import (
+    CONFIDENCE_RATIO,
+    MOTION_WEIGHTS,
+    PATTERN_TYPES,
+    TYPE_WEIGHTS,
+    collect_reference_data,
+    dtw_distance,
+    normalize_time_series,
+)
+
+# 가중치 탐색 범위
+TYPE_WEIGHT_RANGE = (0.2, 2.0)
+MOTION_WEIGHT_RANGE = (0.6, 1.2)
+RATIO_RANGE = (1.0, 1.5)
+
+
+# 작업 프로세스가 보관하는 정규화된 샘플 목록 (_init_pair_worker 에서 프로세스당 한 번만 전달받음)
+_worker_samples = None
+_worker_type_names = None
+
+
+def _init_pair_worker(samples, type_names):
+    """작업 프로세스 초기화: 샘플 목록을 전역에 보관해 작업마다 다시 전달하지 않습니다."""
+    global _worker_samples, _worker_type_names
+    _worker_samples = samples
+    _worker_type_names = type_names
+
+
+def _pair_distances(i):
+    """한 샘플과 뒤쪽 샘플들 사이의 유형별 DTW 거리를 계산합니다 (작업 프로세스용)."""
+    samples = _worker_samples
+    type_names = _worker_type_names
+    n = len(samples)
+    row = np.full((n, len(type_names)), np.nan)
+    for j in range(i + 1, n):
+        for t, ts_type in enumerate(type_names):
+            if ts_type in samples[i] and ts_type in samples[j]:
+                row[j, t] = dtw_distance(samples[i][ts_type], samples[j][ts_type])
+    return i, row
+
+
+def build_distance_tensor(reference_data, use_normalized=True, workers=1):
+    """모든 샘플 쌍의 유형별 DTW 거리를 (N, N, T) 텐서로 한 번만 계산합니다.
+
+    DTW는 대칭으로 보고 i < j 쌍만 계산한 뒤 복사합니다. 자기 자신과의 거리와
+    한쪽에 없는 유형은 NaN 으로 남겨 재채점 시 제외됩니다.
+    """
+    samples = []
+    labels = []
+    for motion_id, reference_list in reference_data.items():
+        for ref_ts in reference_list:
+            samples.append(ref_ts)
+            labels.append(motion_id)
+
+    type_names = list(TYPE_WEIGHTS.keys())
+    n = len(samples)
+    distances = np.full((n, n, len(type_names)), np.nan)
+
+    print(f"DTW 거리 텐서 계산 중: 샘플 {n}개, 유형 {len(type_names)}개")
+    start = time.perf_counter()
+    # 정규화는 쌍마다 하지 않고 샘플마다 한 번만 (필요한 유형만 남김)
+    samples = [
+        {
+            ts_type: normalize_time_series(ref_ts[ts_type]) if use_normalized else ref_ts[ts_type]
+            for ts_type in type_names
+            if ts_type in ref_ts
+        }
+        for ref_ts in samples
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_pair_worker,
+            initargs=(samples, type_names),
+        ) as executor:
+            rows = list(executor.map(_pair_distances, range(n)))
+    else:
+        _init_pair_worker(samples, type_names)
+        rows = [_pair_distances(i) for i in range(n)]
+
+    for i, row in rows:
+        distances[i, i + 1 :] = row[i + 1 :]
+        distances[i + 1 :, i] = row[i + 1 :]
+
+    print(f"DTW 거리 텐서 계산 완료: {time.perf_counter() - start:.1f}초")
+    return distances, np.array(labels), type_names
+
+
+def save_distance_cache(cache_path, distances, labels, type_names):
+    """거리 텐서를 .npz 파일로 저장합니다."""
+    np.savez(
+        cache_path, distances=distances, labels=labels, type_names=np.array(type_names)
+    )
+    print(f"거리 텐서 캐시 저장: {cache_path}")
+
+
+def load_distance_cache(cache_path):
+    """저장된 거리 텐서를 불러옵니다."""
+    with np.load(cache_path) as cache:
+        distances = cache["distances"]
+        labels = cache["labels"]
+        type_names = [str(t) for t in cache["type_names"]]
+    print(f"거리 텐서 캐시 사용: {cache_path} (샘플 {len(labels)}개)")
+    return distances, labels, type_names
+
+
+class ConfigScorer:
+    """캐시된 거리 텐서로 여러 가중치 설정을 한꺼번에 재채점합니다.
+
+    classify_with_dtw 의 판정 규칙(유형 가중 평균, 동작별 최소 거리, 패턴 점수,
+    동작 가중치, 신뢰도 비율 규칙)을 배열 연산으로 그대로 옮긴 것입니다.
+    """
+
+    def __init__(self, distances, labels, type_names):
+        # 참조 샘플을 동작 순서로 정렬해 두면 동작별 최소/최대를 reduceat 한 번으로 구할 수 있음
+        order = np.argsort(labels, kind="stable")
+        self.distances = distances[order][:, order]
+        self.labels = labels[order]
+        self.type_names = type_names
+        self.motions, self.motion_starts = np.unique(self.labels, return_index=True)
+
+        valid = ~np.isnan(self.distances)
+        self.mask = valid.astype(np.float64)
+        self.filled = np.where(valid, self.distances, 0.0)
+        self.pair_valid = valid.any(axis=-1)
+
+        # 패턴 점수는 가중치와 무관하므로 미리 계산
+        pattern_idx = [type_names.index(t) for t in PATTERN_TYPES if t in type_names]
+        pattern_count = self.mask[..., pattern_idx].sum(axis=-1)
+        pattern_sum = self.filled[..., pattern_idx].sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pattern_mean = pattern_sum / pattern_count
+        pattern_scores = np.where(pattern_count > 0, 1.0 / (1.0 + pattern_mean), 0.0)
+        self.pattern_scores = np.where(self.pair_valid, pattern_scores, -np.inf)
+
+    def predict(self, type_w, motion_w, ratios, query_idx, ref_idx):
+        """(K, T), (K, M), (K,) 설정 배치에 대해 질의 샘플들의 예측 동작 (K, Q)를 반환합니다."""
+        ref_idx = np.sort(ref_idx)
+        ref_labels = self.labels[ref_idx]
+        motions, starts = np.unique(ref_labels, return_index=True)
+        motion_cols = np.searchsorted(self.motions, motions)
+
+        filled = self.filled[np.ix_(query_idx, ref_idx)]
+        mask = self.mask[np.ix_(query_idx, ref_idx)]
+        pair_valid = self.pair_valid[np.ix_(query_idx, ref_idx)]
+
+        # 유형 가중 평균 거리 (K, Q, R)
+        weighted_sum = np.einsum("qrt,kt->kqr", filled, type_w, optimize=True)
+        weight_sum = np.einsum("qrt,kt->kqr", mask, type_w, optimize=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_dist = weighted_sum / weight_sum
+        avg_dist = np.where(pair_valid, avg_dist, np.inf)
+
+        # 동작별 최소 거리 (K, Q, M) 와 최대 패턴 점수 (Q, M)
+        min_dist = np.minimum.reduceat(avg_dist, starts, axis=-1)
+        pattern = self.pattern_scores[np.ix_(query_idx, ref_idx)]
+        best_pattern = np.maximum.reduceat(pattern, starts, axis=-1)
+        present = np.isfinite(min_dist)
+
+        weights = motion_w[:, motion_cols][:, None, :]
+        confidence = 1.0 / (1.0 + min_dist) * best_pattern / weights
+        confidence = np.where(present, confidence, -np.inf)
+        weighted_dist = min_dist * weights
+
+        best_conf = np.argmax(confidence, axis=-1)
+        best_dist = np.argmin(weighted_dist, axis=-1)
+        conf_dist = np.take_along_axis(weighted_dist, best_conf[..., None], -1)[..., 0]
+        min_value = np.take_along_axis(weighted_dist, best_dist[..., None], -1)[..., 0]
+        choice = np.where(conf_dist < min_value * ratios[:, None], best_conf, best_dist)
+        return motions[choice]
+
+    def accuracy(self, type_w, motion_w, ratios, query_idx, ref_idx, batch_size=256):
+        """설정 배치별 정확도 (K,)를 계산합니다. 메모리를 위해 batch_size 단위로 나눕니다."""
+        truth = self.labels[query_idx]
+        result = np.empty(len(type_w))
+        for start in range(0, len(type_w), batch_size):
+            end = start + batch_size
+            predicted = self.predict(
+                type_w[start:end], motion_w[start:end], ratios[start:end], query_idx, ref_idx
+            )
+            result[start:end] = (predicted == truth).mean(axis=-1)
+        return result
+
+
+def baseline_config(type_names, motions):
+    """classifier.py 의 현재 수동 가중치를 배열 형태로 반환합니다."""
+    type_w = np.array([[TYPE_WEIGHTS[t] for t in type_names]])
+    motion_w = np.array([[MOTION_WEIGHTS.get(int(m), 1.0) for m in motions]])
+    ratios = np.array([CONFIDENCE_RATIO])
+    return type_w, motion_w, ratios
+
+
+def sample_configs(rng, count, n_types, n_motions, elite=None, spread=0.15):
+    """무작위 설정을 생성합니다. elite 가 있으면 절반은 그 주변에서 섭동합니다."""
+    type_w = rng.uniform(*TYPE_WEIGHT_RANGE, size=(count, n_types))
+    motion_w = rng.uniform(*MOTION_WEIGHT_RANGE, size=(count, n_motions))
+    ratios = rng.uniform(*RATIO_RANGE, size=count)
+
+    if elite is not None:
+        local = count // 2
+        pick = rng.integers(0, len(elite[0]), size=local)
+        type_w[:local] = elite[0][pick] * rng.lognormal(0, spread, (local, n_types))
+        motion_w[:local] = elite[1][pick] * rng.lognormal(0, spread, (local, n_motions))
+        ratios[:local] = elite[2][pick] + rng.normal(0, spread / 2, local)
+        np.clip(type_w, *TYPE_WEIGHT_RANGE, out=type_w)
+        np.clip(motion_w, *MOTION_WEIGHT_RANGE, out=motion_w)
+        np.clip(ratios, *RATIO_RANGE, out=ratios)
+
+    return type_w, motion_w, ratios
+
+
+def search_weights(scorer, query_idx, ref_idx, rounds=20, batch=4096, seed=0, verbose=True):
+    """무작위 탐색 + 상위 설정 주변 섭동으로 가장 정확한 설정을 찾습니다."""
+    rng = np.random.default_rng(seed)
+    n_types = len(scorer.type_names)
+    n_motions = len(scorer.motions)
+
+    best = baseline_config(scorer.type_names, scorer.motions)
+    best_acc = scorer.accuracy(*best, query_idx, ref_idx)[0]
+    baseline_acc = best_acc
+    elite = best
+    evaluated = 1
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        type_w, motion_w, ratios = sample_configs(rng, batch, n_types, n_motions, elite)
+        acc = scorer.accuracy(type_w, motion_w, ratios, query_idx, ref_idx)
+        evaluated += batch
+
+        top = np.argsort(-acc, kind="stable")[:32]
+        elite = (type_w[top], motion_w[top], ratios[top])
+        # 같은 정확도면 기존 설정 유지 (수동 설정이 기본값)
+        if acc[top[0]] > best_acc:
+            best_acc = acc[top[0]]
+            best = (type_w[top[:1]], motion_w[top[:1]], ratios[top[:1]])
+
+    elapsed = time.perf_counter() - start
+    if verbose:
+        print(
+            f"설정 {evaluated}개 평가: {elapsed:.2f}초 ({evaluated / max(elapsed, 1e-9):.0f}개/초), "
+            f"기준 정확도 {baseline_acc:.3f} → 최고 {best_acc:.3f}"
+        )
+    return best, best_acc, baseline_acc
+
+
+def cross_validate(scorer, folds=5, seed=0, **search_kwargs):
+    """k-겹 교차 검증: 학습 폴드에서 찾은 설정을 검증 폴드에서 평가합니다."""
+    rng = np.random.default_rng(seed)
+    n = len(scorer.labels)
+    fold_of = np.empty(n, dtype=int)
+    # 동작별로 섞어서 폴드에 고르게 배분
+    for motion in scorer.motions:
+        members = np.flatnonzero(scorer.labels == motion)
+        rng.shuffle(members)
+        fold_of[members] = np.arange(len(members)) % folds
+
+    fold_acc = []
+    baseline_acc = []
+    for fold in range(folds):
+        test_idx = np.flatnonzero(fold_of == fold)
+        train_idx = np.flatnonzero(fold_of != fold)
+        if len(test_idx) == 0 or len(train_idx) == 0:
+            continue
+        best, _, _ = search_weights(scorer, train_idx, train_idx, verbose=False, **search_kwargs)
+        fold_acc.append(scorer.accuracy(*best, test_idx, train_idx)[0])
+        baseline = baseline_config(scorer.type_names, scorer.motions)
+        baseline_acc.append(scorer.accuracy(*baseline, test_idx, train_idx)[0])
+        print(f"폴드 {fold + 1}/{folds}: 튜닝 {fold_acc[-1]:.3f}, 기준 {baseline_acc[-1]:.3f}")
+
+    return float(np.mean(fold_acc)), float(np.mean(baseline_acc))
+
+
+def config_to_dict(config, type_names, motions):
+    """배열 형태의 설정을 classify_with_dtw 인자 형태로 변환합니다."""
+    type_w, motion_w, ratios = config
+    return {
+        "type_weights": {t: round(float(w), 3) for t, w in zip(type_names, type_w[0])},
+        "motion_weights": {int(m): round(float(w), 3) for m, w in zip(motions, motion_w[0])},
+        "confidence_ratio": round(float(ratios[0]), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DTW 분류기 가중치 자동 튜닝")
+    parser.add_argument("--folder", default="/Users/yoosehyeok/Documents/RecordingData")
+    parser.add_argument("--cache", default=None, help="거리 텐서 캐시 (.npz)")
+    parser.add_argument("--recompute", action="store_true", help="캐시가 있어도 DTW 재계산")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="최적 설정 저장 경로 (.json)")
+    args = parser.parse_args()
+
+    cache_path = args.cache or os.path.join(args.folder, "dtw_distances.npz")
+
+    # 1. 유형별 DTW 거리 텐서 (한 번만 계산)
+    if os.path.exists(cache_path) and not args.recompute:
+        distances, labels, type_names = load_distance_cache(cache_path)
+    else:
+        print("== 참조 데이터 수집 중... ==")
+        reference_data = collect_reference_data(args.folder)
+        if not reference_data:
+            print("주의: 참조 데이터를 찾을 수 없습니다!")
+            exit(1)
+        distances, labels, type_names = build_distance_tensor(
+            reference_data, workers=args.workers
+        )
+        save_distance_cache(cache_path, distances, labels, type_names)
+
+    scorer = ConfigScorer(distances, labels, type_names)
+    everyone = np.arange(len(scorer.labels))
+    search_kwargs = {"rounds": args.rounds, "batch": args.batch, "seed": args.seed}
+
+    # 2. 교차 검증으로 튜닝 효과 추정
+    print(f"\n== {args.folds}-겹 교차 검증 ==")
+    cv_acc, cv_baseline = cross_validate(scorer, folds=args.folds, **search_kwargs)
+
+    # 3. 전체 데이터(leave-one-out)로 최종 설정 탐색
+    print("\n== 전체 데이터 가중치 탐색 ==")
+    best, best_acc, baseline_acc = search_weights(scorer, everyone, everyone, **search_kwargs)
+
+    result = config_to_dict(best, type_names, scorer.motions)
+    result["loo_accuracy"] = round(float(best_acc), 4)
+    result["baseline_loo_accuracy"] = round(float(baseline_acc), 4)
+    result["cv_accuracy"] = round(cv_acc, 4)
+    result["baseline_cv_accuracy"] = round(cv_baseline, 4)
+
+    print("\n========== 튜닝 결과 ==========")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2, ensure_ascii=False)
+        print(f"최적 설정 저장: {args.output}")